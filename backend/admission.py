@@ -0,0 +1,227 @@
+# admission.py
+
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import inc_counter, observe
+
+
+def _total_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+# Concurrent Manim renders and the RAM they may use between them
+RENDER_SLOTS = int(os.getenv("VOICEMATION_RENDER_SLOTS", str(os.cpu_count() or 1)))
+MEMORY_BUDGET_MB = int(os.getenv("VOICEMATION_MEMORY_BUDGET_MB", str(int(_total_memory_mb() * 0.75))))
+# Jobs admitted but not yet finished; beyond this new requests get a 429
+MAX_PENDING = int(os.getenv("VOICEMATION_MAX_PENDING", str(RENDER_SLOTS * 2)))
+# Share of that limit one client may hold, so a single burst can't 429 everyone else
+MAX_PENDING_PER_CLIENT = int(os.getenv("VOICEMATION_MAX_PENDING_PER_CLIENT", str(max(1, MAX_PENDING // 2))))
+
+# Rough per-render memory (Manim + ffmpeg); in-depth scenes hold far more mobjects
+QUICK_MEMORY_MB = 700
+IN_DEPTH_MEMORY_MB = 1500
+# Scenes longer than this are treated as in-depth for memory purposes
+LONG_SCENE_SECONDS = 60
+
+# Whole-job estimates used before GPT has produced any code
+QUICK_ESTIMATE_SECONDS = 40
+IN_DEPTH_ESTIMATE_SECONDS = 200
+
+# Render time per second of scene at -ql, plus fixed startup/LaTeX/mux overhead
+RENDER_SECONDS_PER_SCENE_SECOND = float(os.getenv("VOICEMATION_RENDER_FACTOR", "0.5"))
+RENDER_OVERHEAD_SECONDS = 10
+# Waiting jobs gain this much priority per second queued so long jobs aren't starved
+AGING_PER_SECOND = 1.0
+# Once a job has waited this long, the memory it needs is held back from other jobs
+STARVATION_SECONDS = float(os.getenv("VOICEMATION_STARVATION_SECONDS", "30"))
+
+_WAIT_RE = re.compile(r"self\.wait\(\s*([0-9.]*)")
+
+
+class Saturated(Exception):
+    """Raised when the server has no room for another job."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def estimate_scene_seconds(manim_code):
+    """
+    Approximate scene length: the sum of all self.wait() durations (default 1s)
+    plus about a second per self.play() call.
+    """
+    total = 0.0
+    for value in _WAIT_RE.findall(manim_code):
+        try:
+            total += float(value) if value else 1.0
+        except ValueError:
+            total += 1.0
+    return total + manim_code.count("self.play(")
+
+
+def estimate_render_seconds(manim_code):
+    return RENDER_OVERHEAD_SECONDS + RENDER_SECONDS_PER_SCENE_SECOND * estimate_scene_seconds(manim_code) \
+        + len(manim_code) / 1000.0
+
+
+class Ticket:
+    """An admitted job: who asked for it and what it is expected to cost."""
+
+    def __init__(self, seq, client_id, in_depth_mode):
+        self.seq = seq
+        self.client_id = client_id
+        self.in_depth_mode = in_depth_mode
+        self.cost_seconds = IN_DEPTH_ESTIMATE_SECONDS if in_depth_mode else QUICK_ESTIMATE_SECONDS
+        self.memory_mb = IN_DEPTH_MEMORY_MB if in_depth_mode else QUICK_MEMORY_MB
+        self.queued_at = None
+
+
+class AdmissionController:
+    """
+    Bounds how many jobs are in flight and schedules Manim renders within CPU
+    and memory budgets. Among waiting renders, clients with the fewest renders
+    running go first (fair share), then the shortest estimated job. Smaller jobs
+    may backfill memory a higher-ranked job can't use yet, but once the oldest
+    job has waited STARVATION_SECONDS its memory is reserved: other jobs still
+    start in ranked order, but only if they leave room for it.
+    """
+
+    def __init__(self, slots=RENDER_SLOTS, memory_budget_mb=MEMORY_BUDGET_MB, max_pending=MAX_PENDING,
+                 max_pending_per_client=MAX_PENDING_PER_CLIENT):
+        self.slots = slots
+        self.memory_budget_mb = memory_budget_mb
+        self.max_pending = max_pending
+        self.max_pending_per_client = max_pending_per_client
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._pending = {}     # interactive jobs, counted against max_pending
+        self._background = {}  # batch/local jobs, which queue without limiting interactive ones
+        self._waiting = []
+        self._running = set()
+        self._memory_in_use = 0
+        self._client_running = {}
+
+    def retry_after(self):
+        """Seconds until the interactive backlog should have drained."""
+        with self._cond:
+            backlog = sum(t.cost_seconds for t in self._pending.values())
+        return max(1, math.ceil(backlog / max(self.slots, 1)))
+
+    def admit(self, client_id, in_depth_mode=False, enforce_limit=True):
+        """
+        Register a new job. Raises Saturated if too many jobs are already pending,
+        overall or from this client, unless enforce_limit is False (used for batch
+        runs, which queue instead). Unlimited jobs don't count toward the pending
+        limits or the retry estimate, so a running batch doesn't turn interactive
+        requests into 429s.
+        """
+        with self._cond:
+            client_pending = sum(1 for t in self._pending.values() if t.client_id == client_id)
+            if enforce_limit and (len(self._pending) >= self.max_pending
+                                  or client_pending >= self.max_pending_per_client):
+                retry_after = self.retry_after()
+                inc_counter("voicemation_admission_rejected_total")
+                print(f"🚦 Rejecting job from {client_id}: {len(self._pending)} pending "
+                      f"({client_pending} theirs), retry in {retry_after}s")
+                raise Saturated(retry_after)
+            self._seq += 1
+            ticket = Ticket(self._seq, client_id, in_depth_mode)
+            if enforce_limit:
+                self._pending[ticket.seq] = ticket
+            else:
+                self._background[ticket.seq] = ticket
+        inc_counter("voicemation_admission_admitted_total")
+        return ticket
+
+    def refine(self, ticket, manim_code):
+        """Replace the up-front estimate once the generated code is known."""
+        long_scene = estimate_scene_seconds(manim_code) > LONG_SCENE_SECONDS
+        with self._cond:
+            ticket.cost_seconds = estimate_render_seconds(manim_code)
+            if long_scene or ticket.in_depth_mode:
+                ticket.memory_mb = IN_DEPTH_MEMORY_MB
+        print(f"🚦 Estimated render cost: {ticket.cost_seconds:.0f}s")
+
+    def release(self, ticket):
+        with self._cond:
+            self._pending.pop(ticket.seq, None)
+            self._background.pop(ticket.seq, None)
+            self._cond.notify_all()
+
+    def _priority(self, ticket, now):
+        age = now - ticket.queued_at
+        return (self._client_running.get(ticket.client_id, 0),
+                ticket.cost_seconds - AGING_PER_SECOND * age,
+                ticket.seq)
+
+    def _fits(self, ticket, reserved_mb=0):
+        # A job bigger than the whole budget may still run alone
+        free_mb = self.memory_budget_mb - self._memory_in_use - reserved_mb
+        return ticket.memory_mb <= free_mb or (not self._running and not reserved_mb)
+
+    def _next_runnable(self):
+        if len(self._running) >= self.slots or not self._waiting:
+            return None
+        now = time.monotonic()
+
+        # The longest-waiting job, once starved, holds back the memory it needs
+        oldest = min(self._waiting, key=lambda t: t.queued_at)
+        starved = oldest if now - oldest.queued_at >= STARVATION_SECONDS else None
+        reserved_mb = starved.memory_mb if starved else 0
+
+        ranked = sorted(self._waiting, key=lambda t: self._priority(t, now))
+        for ticket in ranked:
+            if ticket is starved:
+                if self._fits(ticket):
+                    return ticket
+            elif self._fits(ticket, reserved_mb):
+                return ticket
+        return None
+
+    @contextmanager
+    def render_slot(self, ticket, job=None):
+        """
+        Block until this ticket is scheduled for rendering, and hold the slot while inside.
+        If `job` is cancelled while queued, JobCancelled propagates and the ticket leaves the queue.
+        """
+        with self._cond:
+            ticket.queued_at = time.monotonic()
+            self._waiting.append(ticket)
+            try:
+                while self._next_runnable() is not ticket:
+                    if job:
+                        job.check()
+                    self._cond.wait(timeout=1.0 if job else None)
+            finally:
+                self._waiting.remove(ticket)
+                # Another waiter may now be first in line or fit in the remaining slots/memory
+                self._cond.notify_all()
+            self._running.add(ticket.seq)
+            self._memory_in_use += ticket.memory_mb
+            self._client_running[ticket.client_id] = self._client_running.get(ticket.client_id, 0) + 1
+            queued_for = time.monotonic() - ticket.queued_at
+        observe("voicemation_render_queue_seconds", queued_for)
+        if queued_for > 1:
+            print(f"🚦 Job from {ticket.client_id} waited {queued_for:.1f}s for a render slot")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running.discard(ticket.seq)
+                self._memory_in_use -= ticket.memory_mb
+                self._client_running[ticket.client_id] -= 1
+                if not self._client_running[ticket.client_id]:
+                    del self._client_running[ticket.client_id]
+                self._cond.notify_all()
+
+
+controller = AdmissionController()
@@ -6,24 +6,49 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from flask_cors import CORS
+import math
 import os
 import tempfile
 import subprocess
+import uuid
 from voicemation import process_speech  # existing pipeline
+from metrics import render_metrics
+import media_store
+import batch
+from admission import controller as admission_controller, Saturated
+import jobs
 import speech_recognition as sr
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Only behind a proxy that sets X-Client-Id itself; otherwise any caller could
+# claim another client's share of the render queue
+TRUST_CLIENT_ID_HEADER = os.getenv("VOICEMATION_TRUST_CLIENT_ID_HEADER", "").lower() in ("1", "true", "yes")
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 OUTPUT_VIDEO = None  # store the latest video path
 
 
+def _client_id():
+    """Who a request counts against for fair-share scheduling and the pending limits"""
+    if TRUST_CLIENT_ID_HEADER and request.headers.get("X-Client-Id"):
+        return request.headers["X-Client-Id"]
+    return request.remote_addr or "anonymous"
+
+
+def _busy_response(e):
+    """429 telling the client when the render backlog should have room again"""
+    response = jsonify({"success": False, "error": "Server busy, please retry later", "retryAfter": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -39,7 +64,14 @@ def generate():
     if not text.strip():
         return jsonify({"error": "No text provided"}), 400
 
-    OUTPUT_VIDEO = process_speech(text, False)  # Default to normal mode for this endpoint
+    try:
+        ticket = admission_controller.admit(_client_id())
+    except Saturated as e:
+        return _busy_response(e)
+    try:
+        OUTPUT_VIDEO = process_speech(text, False, ticket=ticket)  # Default to normal mode for this endpoint
+    finally:
+        admission_controller.release(ticket)
 
     if OUTPUT_VIDEO:
         return jsonify({"message": "Video generated!", "video_url": "/download"})
@@ -55,15 +87,81 @@ def download():
     return "No video generated yet.", 404
 
 
-@app.route("/video/<path:filename>")
-def serve_video(filename):
-    """Serve video files from the media directory"""
-    video_path = os.path.join(os.getcwd(), filename)
-    if os.path.exists(video_path):
-        return send_file(video_path, as_attachment=False, mimetype='video/mp4')
+@app.route("/video/<job_id>")
+def serve_video(job_id):
+    """Serve a job's video from the media store index"""
+    video_path = media_store.lookup(job_id)
+    if video_path:
+        # Retention may evict the file between the lookup and send_file opening it
+        try:
+            return send_file(os.path.abspath(video_path), as_attachment=False, mimetype='video/mp4')
+        except FileNotFoundError:
+            pass
     return "Video not found.", 404
 
 
+@app.route("/generate_batch", methods=["POST"])
+def generate_batch():
+    """Start a bulk generation run in the background and return its manifest URL"""
+    data = request.get_json(silent=True) or {}
+    prompts = data.get("prompts", [])
+    in_depth_mode = bool(data.get("inDepthMode", False))
+
+    if not isinstance(prompts, list):
+        return jsonify({"success": False, "error": "prompts must be a list"}), 400
+    try:
+        items = batch.normalize_items(prompts, in_depth_mode)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not items:
+        return jsonify({"success": False, "error": "No prompts provided"}), 400
+
+    batch_id = data.get("batchId") or uuid.uuid4().hex[:12]
+    manifest_path = batch.manifest_path_for(batch_id)
+    if manifest_path is None:
+        return jsonify({"success": False, "error": "Invalid batchId"}), 400
+
+    # Passing an existing batchId resumes that batch, skipping finished items
+    if not batch.start_batch(prompts, manifest_path, in_depth_mode, batch_id):
+        return jsonify({"success": False, "error": "Batch is already running", "batchId": batch_id}), 409
+
+    return jsonify({
+        "success": True,
+        "batchId": batch_id,
+        "manifestUrl": f"/batch/{batch_id}",
+    }), 202
+
+
+@app.route("/batch/<batch_id>")
+def batch_manifest(batch_id):
+    """Return the manifest (per-item status, video URLs and timings) for a batch"""
+    manifest_path = batch.manifest_path_for(batch_id)
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return jsonify({"success": False, "error": "Batch not found"}), 404
+    return send_file(os.path.abspath(manifest_path), mimetype="application/json")
+
+
+@app.route("/cancel", methods=["POST"])
+@app.route("/cancel/<job_id>", methods=["POST"])
+def cancel(job_id=None):
+    """Cancel a running job by ID, or the newest job of a session (JSON sessionId / X-Session-Id)"""
+    data = request.get_json(silent=True) or {}
+    job_id = job_id or data.get("jobId")
+    session_id = request.headers.get("X-Session-Id") or data.get("sessionId")
+    if not job_id and not session_id:
+        return jsonify({"success": False, "error": "No jobId or sessionId provided"}), 400
+
+    if jobs.cancel_job(job_id=job_id, session_id=session_id):
+        return jsonify({"success": True, "cancelled": True})
+    return jsonify({"success": False, "error": "No running job found"}), 404
+
+
+@app.route("/metrics")
+def metrics():
+    """Expose pipeline counters and stage timings in Prometheus text format"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
 # NEW: Voice-only route with WebM -> WAV conversion
 @app.route("/generate_audio", methods=["POST"])
 def generate_audio():
@@ -125,23 +223,69 @@ def generate_audio():
     else:
         return jsonify({"success": False, "error": "No audio file or text provided"}), 400
 
+    client_id = _client_id()
+    fields = request.get_json(silent=True) or request.form
+
+    # A client-supplied jobId lets the caller cancel this request while it runs;
+    # a newer request from the same session cancels this one. Only an explicit
+    # session ID opts in: many browsers can share one address (dev proxy, NAT)
+    job_id = str(fields.get("jobId") or "")
+    if not job_id:
+        job_id = uuid.uuid4().hex[:12]
+    elif not job_id.isalnum():
+        return jsonify({"success": False, "error": "Invalid jobId"}), 400
+    elif media_store.is_indexed(job_id):
+        # Reusing a finished job's ID would replace what /video/<jobId> serves
+        return jsonify({"success": False, "error": "jobId already in use"}), 409
+    session_id = request.headers.get("X-Session-Id") or fields.get("sessionId")
+    session_id = str(session_id) if session_id else None
+    deadline_seconds = jobs.DEFAULT_DEADLINE_SECONDS
+    if fields.get("deadlineSeconds") not in (None, ""):
+        try:
+            deadline_seconds = float(fields["deadlineSeconds"])
+        except (TypeError, ValueError):
+            deadline_seconds = math.nan
+        if not math.isfinite(deadline_seconds) or deadline_seconds <= 0:
+            return jsonify({"success": False, "error": "deadlineSeconds must be a positive number"}), 400
+
+    # Admission control: refuse new work when the render backlog is full. This
+    # comes before registering the job, so a rejected request doesn't supersede
+    # (and lose) the session's current one
+    try:
+        ticket = admission_controller.admit(client_id, in_depth_mode)
+    except Saturated as e:
+        return _busy_response(e)
+    try:
+        job = jobs.start_job(job_id, session_id, min(deadline_seconds, jobs.DEFAULT_DEADLINE_SECONDS))
+    except jobs.JobIdInUse:
+        admission_controller.release(ticket)
+        return jsonify({"success": False, "error": "jobId already in use"}), 409
+
     # Call existing pipeline
     try:
-        print(f"🚀 Calling process_speech('{speech_text}', {in_depth_mode})")
-        OUTPUT_VIDEO = process_speech(speech_text, in_depth_mode)
+        print(f"🚀 Calling process_speech('{speech_text}', {in_depth_mode}) as job {job_id}")
+        OUTPUT_VIDEO = process_speech(speech_text, in_depth_mode, job_id=job_id, ticket=ticket, job=job)
         print(f"🎬 process_speech returned: {OUTPUT_VIDEO}")
+    except jobs.DeadlineExceeded:
+        return jsonify({"success": False, "jobId": job_id, "error": "Generation timed out"}), 504
+    except jobs.JobCancelled as e:
+        return jsonify({"success": False, "jobId": job_id, "cancelled": True, "error": f"Job {e.reason}"}), 409
     except Exception as e:
         print(f"❌ Error in process_speech: {str(e)}")
         print(f"❌ Error type: {type(e).__name__}")
         import traceback
         traceback.print_exc()
         return jsonify({"success": False, "error": f"Pipeline error: {str(e)}"}), 500
+    finally:
+        admission_controller.release(ticket)
+        jobs.finish_job(job)
 
     if OUTPUT_VIDEO:
-        # Return the relative path from the server root for the frontend
-        video_url = f"/video/{OUTPUT_VIDEO}"
+        # Videos are served by job ID from the media store
+        video_url = f"/video/{job_id}"
         return jsonify({
             "success": True,
+            "jobId": job_id,
             "videoUrl": video_url, 
             "prompt": speech_text,
             "video_url": video_url,  # Keep both for compatibility
@@ -0,0 +1,295 @@
+# batch.py
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import prompt_hash, inc_counter, track_request
+from voicemation import prepare_scene, render_scene
+from admission import controller as admission_controller
+import media_store
+import jobs
+
+
+# GitHub Models rate-limits per minute; keep LLM calls under this across all workers
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("VOICEMATION_LLM_RPM", "10"))
+LLM_CONCURRENCY = int(os.getenv("VOICEMATION_LLM_CONCURRENCY", "4"))
+# Manim renders are separate processes, so one render per core keeps every core busy
+RENDER_WORKERS = int(os.getenv("VOICEMATION_RENDER_WORKERS", str(os.cpu_count() or 1)))
+
+BATCH_DIR = os.path.join("media", "batches")
+
+
+class RateLimiter:
+    """
+    Spaces out calls so no more than `per_minute` start in any minute, across threads.
+    """
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+_llm_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+_llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+_running_lock = threading.Lock()
+_running = set()  # absolute manifest paths of batches currently running
+
+
+class BatchInProgress(Exception):
+    """Raised when a batch is started while a run on the same manifest is still going."""
+
+
+def load_prompts(path):
+    """
+    Read prompts from a JSONL file (objects with "text"/"prompt" and optional "inDepthMode"),
+    a JSON list, or a plain text file with one topic per line.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    stripped = content.strip()
+    if stripped.startswith("["):
+        return json.loads(stripped)
+
+    prompts = []
+    for line in stripped.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        prompts.append(json.loads(line) if line.startswith("{") else line)
+    return prompts
+
+
+def normalize_items(prompts, in_depth_mode=False):
+    """
+    Turn raw prompts into batch items, dropping duplicate topics (same text
+    ignoring case/whitespace, same mode). Each item gets a stable key.
+    Raises ValueError for a prompt that is neither a string nor an object with a string text.
+    """
+    items = []
+    seen = set()
+    for index, prompt in enumerate(prompts):
+        if isinstance(prompt, dict):
+            text = prompt.get("text") or prompt.get("prompt") or ""
+            depth = bool(prompt.get("inDepthMode", in_depth_mode))
+        else:
+            text, depth = prompt, in_depth_mode
+        if not isinstance(text, str):
+            raise ValueError(f'Prompt {index} must be a string or an object with a "text" string')
+
+        text = " ".join(text.split())
+        if not text:
+            continue
+        key = prompt_hash(f"{text.lower()}|{'deep' if depth else 'quick'}")
+        if key in seen:
+            print(f"♻️ Skipping duplicate topic: {text}")
+            continue
+        seen.add(key)
+        items.append({"key": key, "text": text, "inDepthMode": depth})
+    return items
+
+
+def manifest_path_for(batch_id):
+    """
+    Manifest location for a batch started through the API, or None for a malformed ID.
+    """
+    if not isinstance(batch_id, str) or not batch_id.isalnum():
+        return None
+    return os.path.join(BATCH_DIR, f"{batch_id}.json")
+
+
+def _load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"items": {}}
+
+
+def _write_manifest(manifest_path, manifest):
+    # Write to a temp file and rename so an interrupted run never leaves a torn manifest
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def job_id_for(batch_id, key):
+    """
+    Job ID for one batch item. Scoped to the batch so two batches with the same
+    topic never share render files or media store entries.
+    """
+    return prompt_hash(f"{batch_id}|{key}")
+
+
+def _claim(manifest_path):
+    path = os.path.abspath(manifest_path)
+    with _running_lock:
+        if path in _running:
+            return False
+        _running.add(path)
+        return True
+
+
+def _release(manifest_path):
+    with _running_lock:
+        _running.discard(os.path.abspath(manifest_path))
+
+
+def _is_complete(entry):
+    return entry.get("status") == "done" and media_store.lookup(entry["jobId"]) is not None
+
+
+def _process_item(item, record):
+    """
+    Generate one item end to end as a tracked request: a rate-limited LLM call,
+    then a render queued through the admission controller. The item is registered
+    as a job (no deadline) so its ID can't be claimed by another request while it runs,
+    and can be cancelled through /cancel/<jobId>.
+    """
+    job = jobs.start_job(item["jobId"], deadline_seconds=float("inf"))
+    try:
+        return _generate_item(item, record, job)
+    except jobs.JobCancelled as e:
+        job.cleanup()
+        return {"status": "cancelled", "error": f"Job {e.reason}"}
+    finally:
+        jobs.finish_job(job)
+
+
+def _generate_item(item, record, job):
+    with track_request(item["text"], request_id=item["jobId"]) as tracked:
+        with _llm_slots:
+            _llm_limiter.wait()
+            start = time.perf_counter()
+            explanation, manim_code = prepare_scene(item["text"], item["inDepthMode"], job)
+            llm_seconds = round(time.perf_counter() - start, 3)
+
+        if not manim_code:
+            tracked["failed"] = True
+            return {"status": "error", "error": "No valid Manim code generated", "llmSeconds": llm_seconds}
+        record(item, status="rendering", llmSeconds=llm_seconds)
+
+        # Batch jobs share render slots with interactive ones as a single "batch" client,
+        # so fair-share scheduling keeps a large batch from starving live requests
+        ticket = admission_controller.admit("batch", item["inDepthMode"], enforce_limit=False)
+        start = time.perf_counter()
+        try:
+            video_path = render_scene(explanation, manim_code, item["jobId"], ticket, job)
+        finally:
+            admission_controller.release(ticket)
+        render_seconds = round(time.perf_counter() - start, 3)
+
+        if not video_path:
+            tracked["failed"] = True
+        return {
+            "status": "done" if video_path else "error",
+            "videoPath": video_path,
+            "videoUrl": f"/video/{item['jobId']}" if video_path else None,
+            "renderSeconds": render_seconds,
+            "error": None if video_path else "Render failed",
+        }
+
+
+def run_batch(prompts, manifest_path, in_depth_mode=False, batch_id=None):
+    """
+    Generate an animation for every prompt. LLM calls run concurrently under the
+    rate limit and renders are scheduled across all cores by the admission controller.
+    Results and timings are written to a JSON manifest after every item; re-running
+    with the same manifest skips items whose video is still in the media store.
+    Raises BatchInProgress if the manifest is already being run. Returns the manifest.
+    """
+    if not _claim(manifest_path):
+        raise BatchInProgress(manifest_path)
+    try:
+        return _run_batch(prompts, manifest_path, in_depth_mode, batch_id)
+    finally:
+        _release(manifest_path)
+
+
+def start_batch(prompts, manifest_path, in_depth_mode=False, batch_id=None):
+    """
+    Run a batch on a background thread. Returns False, without starting anything,
+    if a run on the same manifest is still in progress.
+    """
+    if not _claim(manifest_path):
+        return False
+
+    def target():
+        try:
+            _run_batch(prompts, manifest_path, in_depth_mode, batch_id)
+        finally:
+            _release(manifest_path)
+
+    threading.Thread(target=target, daemon=True).start()
+    return True
+
+
+def _run_batch(prompts, manifest_path, in_depth_mode, batch_id):
+    items = normalize_items(prompts, in_depth_mode)
+    manifest = _load_manifest(manifest_path)
+    manifest_lock = threading.Lock()
+    batch_id = batch_id or manifest.get("batchId") or prompt_hash(os.path.abspath(manifest_path))
+    manifest["batchId"] = batch_id
+
+    pending = []
+    for item in items:
+        item["jobId"] = job_id_for(batch_id, item["key"])
+        entry = manifest["items"].get(item["key"])
+        if entry and _is_complete(entry):
+            print(f"⏭️ Already done: {item['text']}")
+            continue
+        manifest["items"][item["key"]] = {
+            "prompt": item["text"],
+            "inDepthMode": item["inDepthMode"],
+            "jobId": item["jobId"],
+            "status": "pending",
+        }
+        pending.append(item)
+
+    manifest["total"] = len(items)
+    _write_manifest(manifest_path, manifest)
+    print(f"📚 Batch {batch_id}: {len(items)} unique prompts, {len(pending)} to generate")
+
+    def record(item, **fields):
+        with manifest_lock:
+            manifest["items"][item["key"]].update(fields)
+            _write_manifest(manifest_path, manifest)
+
+    batch_start = time.perf_counter()
+    # Enough threads for every LLM call and every render slot to be busy at once;
+    # _llm_slots and the admission controller do the actual limiting
+    with ThreadPoolExecutor(max_workers=LLM_CONCURRENCY + RENDER_WORKERS) as pool:
+        futures = {pool.submit(_process_item, item, record): item for item in pending}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Batch item failed for '{item['text']}': {e}")
+                result = {"status": "error", "error": str(e)}
+            inc_counter("voicemation_batch_items_total", status=result["status"])
+            record(item, **result)
+
+    with manifest_lock:
+        manifest["elapsedSeconds"] = round(time.perf_counter() - batch_start, 3)
+        manifest["completed"] = sum(1 for item in items if manifest["items"][item["key"]].get("status") == "done")
+        _write_manifest(manifest_path, manifest)
+
+    print(f"✅ Batch finished: {manifest['completed']}/{len(items)} videos in {manifest['elapsedSeconds']:.1f}s")
+    return manifest
@@ -0,0 +1,236 @@
+# jobs.py
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+import media_store
+from metrics import inc_counter
+
+
+# End-to-end budget for one /generate_audio request, LLM call through final mux
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("VOICEMATION_JOB_DEADLINE_SECONDS", "600"))
+
+# How often blocking waits wake up to check for cancellation
+POLL_SECONDS = 0.5
+
+_lock = threading.Lock()
+_jobs = {}      # job_id -> Job
+_sessions = {}  # session_id -> job_id of its newest job
+
+
+class JobCancelled(Exception):
+    """Raised inside the pipeline once its job has been cancelled."""
+
+    # Label used for the request and stage it interrupts in /metrics
+    metrics_status = "cancelled"
+
+    def __init__(self, reason="cancelled"):
+        super().__init__(f"Job {reason}")
+        self.reason = reason
+
+
+class DeadlineExceeded(JobCancelled):
+    """Raised inside the pipeline once its job has run past its deadline."""
+
+    def __init__(self):
+        super().__init__("deadline exceeded")
+
+
+class JobIdInUse(Exception):
+    """Raised when a job is started with the ID of a job that is still running."""
+
+
+class Job:
+    """
+    Cancellation state for one pipeline run: a deadline, a cancel flag, the
+    subprocesses it has started and the partial files to remove if it stops early.
+    """
+
+    def __init__(self, job_id, session_id=None, deadline_seconds=DEFAULT_DEADLINE_SECONDS):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.deadline = time.monotonic() + deadline_seconds
+        self.reason = None
+        self._cancelled = threading.Event()
+        self._procs = set()
+        self._artifacts = []
+        self._lock = threading.Lock()
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            procs = list(self._procs)
+        print(f"🛑 Cancelling job {self.job_id}: {reason}")
+        for proc in procs:
+            _kill_tree(proc)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Raise if the job has been cancelled or has run out of time."""
+        if self._cancelled.is_set():
+            raise JobCancelled(self.reason)
+        if time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            raise DeadlineExceeded()
+
+    def track_artifact(self, path):
+        """Remember a partial output to delete if the job doesn't finish."""
+        with self._lock:
+            self._artifacts.append(path)
+
+    def cleanup(self):
+        with self._lock:
+            artifacts, self._artifacts = self._artifacts, []
+        for path in artifacts:
+            media_store.discard_intermediate(path)
+
+    def _add_proc(self, proc):
+        with self._lock:
+            self._procs.add(proc)
+            cancelled = self._cancelled.is_set()
+        if cancelled:
+            _kill_tree(proc)
+
+    def _remove_proc(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+
+def _kill_tree(proc):
+    # Subprocesses are started in their own session, so the group ID is the PID;
+    # killing the group also takes down children such as LaTeX and ffmpeg
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+    # The leader exiting doesn't mean its children did (they may ignore SIGTERM)
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def start_job(job_id, session_id=None, deadline_seconds=DEFAULT_DEADLINE_SECONDS):
+    """
+    Register a job. A newer job from the same session supersedes (cancels) the old one.
+    Raises JobIdInUse if a job with this ID is still running.
+    """
+    job = Job(job_id, session_id, deadline_seconds)
+    with _lock:
+        if job_id in _jobs:
+            raise JobIdInUse(job_id)
+        previous = _jobs.get(_sessions.get(session_id)) if session_id else None
+        _jobs[job_id] = job
+        if session_id:
+            _sessions[session_id] = job_id
+    if previous is not None:
+        inc_counter("voicemation_jobs_superseded_total")
+        previous.cancel("superseded by a newer request")
+    return job
+
+
+def finish_job(job):
+    with _lock:
+        _jobs.pop(job.job_id, None)
+        if job.session_id and _sessions.get(job.session_id) == job.job_id:
+            del _sessions[job.session_id]
+
+
+def cancel_job(job_id=None, session_id=None):
+    """
+    Cancel a running job by ID, or the newest job of a session. Returns False if none is running.
+    """
+    with _lock:
+        if job_id is None and session_id is not None:
+            job_id = _sessions.get(session_id)
+        job = _jobs.get(job_id)
+    if job is None:
+        return False
+    inc_counter("voicemation_jobs_cancelled_total")
+    job.cancel("cancelled by client")
+    return True
+
+
+def run_subprocess(command, job=None, timeout=None, check=False, **kwargs):
+    """
+    Like subprocess.run, but the process tree is killed if the job is cancelled
+    or its deadline passes (raising JobCancelled). Without a job it is subprocess.run.
+    """
+    if job is None:
+        return subprocess.run(command, timeout=timeout, check=check, **kwargs)
+
+    job.check()
+    if kwargs.pop("capture_output", False):
+        kwargs["stdout"] = subprocess.PIPE
+        kwargs["stderr"] = subprocess.PIPE
+
+    started = time.monotonic()
+    proc = subprocess.Popen(command, start_new_session=True, **kwargs)
+    job._add_proc(proc)
+    try:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                if job.cancelled or job.remaining() <= 0:
+                    _kill_tree(proc)
+                    proc.communicate()
+                    job.check()
+                if timeout is not None and time.monotonic() - started > timeout:
+                    _kill_tree(proc)
+                    proc.communicate()
+                    raise subprocess.TimeoutExpired(command, timeout)
+    finally:
+        job._remove_proc(proc)
+
+    job.check()
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+
+
+def run_cancellable(fn, *args, job=None, **kwargs):
+    """
+    Run a blocking call (e.g. a network request) so the job can stop waiting for it.
+    The call itself can't be interrupted; on cancel its result is simply abandoned.
+    """
+    if job is None:
+        return fn(*args, **kwargs)
+
+    job.check()
+    result = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            result["value"] = fn(*args, **kwargs)
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, daemon=True).start()
+    while not done.wait(POLL_SECONDS):
+        job.check()
+    job.check()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
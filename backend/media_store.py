@@ -0,0 +1,195 @@
+# media_store.py
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+
+# Absolute, so stored paths stay valid for Flask's send_file (which resolves
+# relative paths against the app root, not the working directory)
+STORE_DIR = os.path.abspath(os.getenv("VOICEMATION_MEDIA_STORE", os.path.join("media", "store")))
+INDEX_PATH = os.path.join(STORE_DIR, "index.sqlite3")
+
+# Retention limits: total size of stored outputs and max age since last access
+QUOTA_BYTES = int(float(os.getenv("VOICEMATION_MEDIA_QUOTA_MB", "1024")) * 1024 * 1024)
+TTL_SECONDS = float(os.getenv("VOICEMATION_MEDIA_TTL_HOURS", "168")) * 3600
+
+# Manim's own caches; safe to prune because Manim regenerates them on demand
+CACHE_DIRS = [os.path.join("media", "Tex"), os.path.join("media", "texts")]
+
+_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, kind)
+);
+CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts(sha256);
+"""
+
+
+def _connect():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ingest(job_id, path, kind="video"):
+    """
+    Move a finished output into the store and index it under job_id.
+    Identical content is stored once; a duplicate upload just gets a new index row.
+    Returns the stored file path.
+    """
+    sha256 = _file_sha256(path)
+    ext = os.path.splitext(path)[1]
+    stored_path = os.path.join(STORE_DIR, sha256[:2], sha256 + ext)
+    now = time.time()
+
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row and os.path.exists(row[0]):
+                stored_path = row[0]
+                os.remove(path)
+                print(f"♻️ Deduplicated {kind} for job {job_id} ({sha256[:12]})")
+                conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (now, sha256))
+            else:
+                os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+                shutil.move(path, stored_path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, stored_path, os.path.getsize(stored_path), now, now),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (job_id, kind, sha256, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, kind, sha256, now),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    print(f"📦 Stored {kind} for job {job_id} at: {stored_path}")
+    enforce_retention(keep=sha256)
+    return stored_path
+
+
+def lookup(job_id, kind="video"):
+    """
+    Return the stored path for a job's artifact (refreshing its LRU timestamp), or None.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT b.sha256, b.path FROM artifacts a JOIN blobs b ON a.sha256 = b.sha256 "
+                "WHERE a.job_id = ? AND a.kind = ?",
+                (job_id, kind),
+            ).fetchone()
+            if not row or not os.path.exists(row[1]):
+                return None
+            conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (time.time(), row[0]))
+            conn.commit()
+            return row[1]
+        finally:
+            conn.close()
+
+
+def is_indexed(job_id):
+    """
+    True if any artifact is indexed under job_id, even if its file has since gone.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            return conn.execute("SELECT 1 FROM artifacts WHERE job_id = ?", (job_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+
+def discard_intermediate(path):
+    """
+    Delete an intermediate file or directory (e.g. the silent render once it has been muxed).
+    """
+    if path and os.path.isdir(path):
+        shutil.rmtree(path)
+        print(f"🧹 Removed intermediate directory: {path}")
+    elif path and os.path.exists(path):
+        os.remove(path)
+        print(f"🧹 Removed intermediate file: {path}")
+
+
+def _evict(conn, sha256, path):
+    conn.execute("DELETE FROM artifacts WHERE sha256 = ?", (sha256,))
+    conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _prune_caches(now):
+    for cache_dir in CACHE_DIRS:
+        if not os.path.isdir(cache_dir):
+            continue
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and now - entry.stat().st_atime > TTL_SECONDS:
+                os.remove(entry.path)
+
+
+def enforce_retention(keep=None):
+    """
+    Drop outputs not accessed within the TTL, then evict least recently used
+    outputs until the store fits the disk quota. Also prunes stale Manim caches.
+    The blob whose hash is `keep` (the output just stored) is never evicted.
+    """
+    now = time.time()
+    evicted = 0
+    with _lock:
+        conn = _connect()
+        try:
+            for sha256, path in conn.execute(
+                "SELECT sha256, path FROM blobs WHERE last_access < ?", (now - TTL_SECONDS,)
+            ).fetchall():
+                _evict(conn, sha256, path)
+                evicted += 1
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total > QUOTA_BYTES:
+                for sha256, path, size in conn.execute(
+                    "SELECT sha256, path, size FROM blobs ORDER BY last_access ASC"
+                ).fetchall():
+                    if total <= QUOTA_BYTES:
+                        break
+                    if sha256 == keep:
+                        continue
+                    _evict(conn, sha256, path)
+                    total -= size
+                    evicted += 1
+            conn.commit()
+        finally:
+            conn.close()
+
+    _prune_caches(now)
+    if evicted:
+        print(f"🗑️ Media retention evicted {evicted} stored file(s)")
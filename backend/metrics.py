@@ -0,0 +1,176 @@
+# metrics.py
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+# Requests slower than this (seconds) get a stage breakdown in the slow log
+SLOW_REQUEST_SECONDS = float(os.getenv("VOICEMATION_SLOW_REQUEST_SECONDS", "60"))
+
+# Histogram buckets (seconds) sized for LLM calls through to long Manim renders
+BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket_counts, sum, count]
+
+_current_request = contextvars.ContextVar("voicemation_request", default=None)
+
+# Status labels shared by requests and stages: ok, failed (reported failure by
+# return value), error (raised) and cancelled (stopped by its job)
+OK, FAILED, ERROR, CANCELLED = "ok", "failed", "error", "cancelled"
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc_counter(name, amount=1, **labels):
+    """
+    Increment a counter identified by name and labels.
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """
+    Record a value in a cumulative histogram identified by name and labels.
+    """
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist[0][i] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+def prompt_hash(prompt):
+    """
+    Short stable hash of a prompt so slow requests can be grouped without logging the text.
+    """
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def _status_for(exc):
+    # Exceptions can declare their own status (jobs.JobCancelled does) without
+    # metrics importing them
+    return getattr(exc, "metrics_status", ERROR)
+
+
+def current_request_id():
+    request = _current_request.get()
+    return request["id"] if request else None
+
+
+@contextmanager
+def track_request(prompt, request_id=None):
+    """
+    Track one pipeline run. Stages timed inside this block are attributed to it,
+    and runs slower than SLOW_REQUEST_SECONDS are written to the slow-request log.
+    Yields the request record (id, prompt hash, stage breakdown); set its
+    "failed" or "cancelled" key to count the run under that status.
+    """
+    request = {
+        "id": request_id or uuid.uuid4().hex[:12],
+        "prompt_hash": prompt_hash(prompt),
+        "stages": [],
+    }
+    token = _current_request.set(request)
+    status = ERROR
+    start = time.perf_counter()
+    try:
+        yield request
+        status = FAILED if request.get("failed") else OK
+    except BaseException as e:
+        status = _status_for(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_request.reset(token)
+        if request.get("cancelled"):
+            status = CANCELLED
+        inc_counter("voicemation_requests_total", status=status)
+        observe("voicemation_request_duration_seconds", elapsed)
+        print(f"⏱️ [{request['id']}] request finished in {elapsed:.2f}s ({status})")
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            inc_counter("voicemation_slow_requests_total")
+            print("🐢 Slow request: " + json.dumps({
+                "request_id": request["id"],
+                "prompt_hash": request["prompt_hash"],
+                "total_seconds": round(elapsed, 3),
+                "status": status,
+                "stages": request["stages"],
+            }))
+
+
+@contextmanager
+def stage(name):
+    """
+    Time one pipeline stage, feeding the stage histogram and the current request's breakdown.
+    Yields a span dict; set its "failed" key for stages that report failure by return value.
+    Stages use the same status labels as requests.
+    """
+    request = _current_request.get()
+    span = {}
+    status = ERROR
+    start = time.perf_counter()
+    try:
+        yield span
+        status = FAILED if span.get("failed") else OK
+    except BaseException as e:
+        status = _status_for(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("voicemation_stage_duration_seconds", elapsed, stage=name)
+        inc_counter("voicemation_stage_total", stage=name, status=status)
+        if request is not None:
+            request["stages"].append({"stage": name, "seconds": round(elapsed, 3), "status": status})
+            print(f"⏱️ [{request['id']}] {name} took {elapsed:.2f}s ({status})")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render_metrics():
+    """
+    Render all counters and histograms in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in _histograms.items())
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), (buckets, total, count) in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -4,6 +4,18 @@ const textInput = document.getElementById("textInput");
 let mediaRecorder;
 let audioChunks = [];
 
+// Per-tab session ID; a newer request from this tab cancels the one still running
+function sessionId() {
+    let id = sessionStorage.getItem("voicemationSessionId");
+    if (!id) {
+        id = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID().replace(/-/g, "")
+            : Math.random().toString(36).slice(2) + Date.now().toString(36);
+        sessionStorage.setItem("voicemationSessionId", id);
+    }
+    return id;
+}
+
 // Text input handler
 textBtn.addEventListener("click", async () => {
     const text = textInput.value.trim();
@@ -18,7 +30,8 @@ textBtn.addEventListener("click", async () => {
         const response = await fetch("/generate_audio", {
             method: "POST",
             headers: {
-                "Content-Type": "application/json"
+                "Content-Type": "application/json",
+                "X-Session-Id": sessionId()
             },
             body: JSON.stringify({ text: text })
         });
@@ -61,6 +74,7 @@ recordBtn.addEventListener("click", async () => {
             try {
                 const response = await fetch("/generate_audio", {
                     method: "POST",
+                    headers: { "X-Session-Id": sessionId() },
                     body: formData
                 });
 
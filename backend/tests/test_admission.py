@@ -0,0 +1,200 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import AdmissionController, Saturated
+from jobs import Job, JobCancelled
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+def _hold(controller, ticket, release):
+    """Occupy a render slot until `release` is set."""
+    entered = threading.Event()
+
+    def run():
+        with controller.render_slot(ticket):
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert entered.wait(5)
+    return thread
+
+
+def _enqueue(controller, tickets, started):
+    threads = []
+    for ticket in tickets:
+        def run(ticket=ticket):
+            with controller.render_slot(ticket):
+                started.append(ticket)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        threads.append(thread)
+    _wait_until(lambda: all(ticket in controller._waiting for ticket in tickets))
+    return threads
+
+
+def test_shortest_job_runs_first():
+    controller = AdmissionController(slots=1, memory_budget_mb=10000, max_pending=10, max_pending_per_client=10)
+    release = threading.Event()
+    holder = _hold(controller, controller.admit("x"), release)
+
+    tickets = []
+    for cost in (30, 10, 20):
+        ticket = controller.admit("a")
+        ticket.cost_seconds = cost
+        tickets.append(ticket)
+    started = []
+    threads = _enqueue(controller, tickets, started)
+
+    release.set()
+    for thread in threads + [holder]:
+        thread.join(5)
+    assert [t.cost_seconds for t in started] == [10, 20, 30]
+
+
+def test_client_with_fewer_running_renders_goes_first():
+    controller = AdmissionController(slots=2, memory_budget_mb=10000, max_pending=10, max_pending_per_client=10)
+    keep_a, free_slot = threading.Event(), threading.Event()
+    holder_a = _hold(controller, controller.admit("a"), keep_a)
+    holder_c = _hold(controller, controller.admit("c"), free_slot)
+
+    short_a = controller.admit("a")
+    short_a.cost_seconds = 10
+    long_b = controller.admit("b")
+    long_b.cost_seconds = 50
+    started = []
+    threads = _enqueue(controller, [short_a, long_b], started)
+
+    free_slot.set()
+    _wait_until(lambda: started)
+    assert started[0] is long_b
+
+    keep_a.set()
+    for thread in threads + [holder_a, holder_c]:
+        thread.join(5)
+    assert started == [long_b, short_a]
+
+
+def test_small_jobs_backfill_until_large_job_is_starved(monkeypatch):
+    monkeypatch.setattr(admission, "STARVATION_SECONDS", 0.5)
+    controller = AdmissionController(slots=4, memory_budget_mb=2000, max_pending=10, max_pending_per_client=10)
+    controller._running.add(0)
+    controller._memory_in_use = 700
+
+    big = controller.admit("a", in_depth_mode=True)
+    small = controller.admit("b")
+    now = time.monotonic()
+    big.queued_at = small.queued_at = now
+    controller._waiting = [big, small]
+    # The big job can't fit yet, so the small one may use the free memory
+    assert controller._next_runnable() is small
+
+    big.queued_at = now - 1.0
+    # Once the big job is starved its memory is reserved, so the small one can't take it
+    assert controller._next_runnable() is None
+    # Jobs that leave room for the reservation may still start ahead of it
+    controller.memory_budget_mb = 3000
+    assert controller._next_runnable() is small
+    controller.memory_budget_mb = 2000
+    controller._running.clear()
+    controller._memory_in_use = 0
+    assert controller._next_runnable() is big
+
+
+def test_starved_backlog_keeps_fair_share_order(monkeypatch):
+    monkeypatch.setattr(admission, "STARVATION_SECONDS", 0.05)
+    controller = AdmissionController(slots=2, memory_budget_mb=100000, max_pending=10, max_pending_per_client=10)
+    keep_a, free_slot = threading.Event(), threading.Event()
+    holder_a = _hold(controller, controller.admit("a"), keep_a)
+    holder_x = _hold(controller, controller.admit("x"), free_slot)
+
+    backlog = [controller.admit("a") for _ in range(5)]
+    started = []
+    threads = _enqueue(controller, backlog, started)
+    late_b = controller.admit("b")
+    threads += _enqueue(controller, [late_b], started)
+    time.sleep(0.1)  # the whole backlog is now past STARVATION_SECONDS
+
+    # "a" already has a render running, so "b" gets the free slot despite arriving last
+    free_slot.set()
+    _wait_until(lambda: started)
+    assert started[0] is late_b
+
+    keep_a.set()
+    for thread in threads + [holder_a, holder_x]:
+        thread.join(5)
+    assert len(started) == 6
+
+
+def test_cancelled_ticket_leaves_wait_queue():
+    controller = AdmissionController(slots=1, memory_budget_mb=10000, max_pending=10, max_pending_per_client=10)
+    release = threading.Event()
+    holder = _hold(controller, controller.admit("x"), release)
+
+    ticket = controller.admit("a")
+    job = Job("queued")
+    errors = []
+
+    def run():
+        try:
+            with controller.render_slot(ticket, job):
+                pass
+        except JobCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    _wait_until(lambda: ticket in controller._waiting)
+
+    job.cancel()
+    thread.join(5)
+    assert errors and ticket not in controller._waiting
+    assert ticket.seq not in controller._running
+
+    release.set()
+    holder.join(5)
+
+
+def test_pending_limit_returns_retry_after():
+    controller = AdmissionController(slots=1, memory_budget_mb=10000, max_pending=1)
+    controller.admit("a")
+    with pytest.raises(Saturated) as exc:
+        controller.admit("b")
+    assert exc.value.retry_after >= 1
+
+
+def test_one_client_cannot_fill_the_pending_limit():
+    controller = AdmissionController(slots=1, memory_budget_mb=10000, max_pending=4, max_pending_per_client=2)
+    first = controller.admit("a")
+    controller.admit("a")
+    with pytest.raises(Saturated):
+        controller.admit("a")
+    # Other clients still get in while "a" is at its cap
+    controller.admit("b")
+    controller.release(first)
+    controller.admit("a")
+
+
+def test_batch_tickets_do_not_count_toward_pending_limit():
+    controller = AdmissionController(slots=1, memory_budget_mb=10000, max_pending=1)
+    for _ in range(5):
+        controller.admit("batch", enforce_limit=False)
+    assert controller.retry_after() == 1
+    ticket = controller.admit("a")
+    controller.release(ticket)
+
+
+def test_scene_estimate_uses_wait_totals():
+    code = "self.play(Write(t))\nself.wait(10)\nself.wait()\n"
+    assert admission.estimate_scene_seconds(code) == 12
@@ -0,0 +1,146 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+# batch imports the GPT/Manim pipeline at module level; these tests replace its
+# two entry points with fakes, so a stand-in module is enough to import batch
+sys.modules.setdefault("voicemation", types.SimpleNamespace(prepare_scene=None, render_scene=None))
+
+import batch
+import jobs
+import media_store
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    store_dir = tmp_path / "store"
+    monkeypatch.setattr(media_store, "STORE_DIR", str(store_dir))
+    monkeypatch.setattr(media_store, "INDEX_PATH", str(store_dir / "index.sqlite3"))
+    monkeypatch.setattr(media_store, "CACHE_DIRS", [])
+    monkeypatch.setattr(batch, "_llm_limiter", batch.RateLimiter(0))
+
+    rendered = []
+    failing = set()
+
+    def prepare_scene(text, in_depth_mode=False, job=None):
+        return f"About {text}", f"# scene for {text}"
+
+    def render_scene(explanation, manim_code, job_id, ticket=None, job=None):
+        rendered.append(explanation)
+        if explanation in failing:
+            return None
+        output = tmp_path / f"{job_id}.mp4"
+        output.write_text(manim_code)
+        return media_store.ingest(job_id, str(output))
+
+    monkeypatch.setattr(batch, "prepare_scene", prepare_scene)
+    monkeypatch.setattr(batch, "render_scene", render_scene)
+    return types.SimpleNamespace(rendered=rendered, failing=failing)
+
+
+def test_duplicate_topics_are_dropped_ignoring_case_and_whitespace():
+    items = batch.normalize_items([
+        "Fourier series",
+        "  fourier   SERIES ",
+        {"prompt": "FOURIER series"},
+        {"text": "Fourier series", "inDepthMode": True},
+        "",
+        "Eigenvalues",
+    ])
+
+    assert [(item["text"], item["inDepthMode"]) for item in items] == [
+        ("Fourier series", False),
+        ("Fourier series", True),
+        ("Eigenvalues", False),
+    ]
+    assert len({item["key"] for item in items}) == 3
+
+
+@pytest.mark.parametrize("prompt", [None, 5, {"text": 5}, {"prompt": ["a"]}])
+def test_malformed_prompts_are_rejected(prompt):
+    with pytest.raises(ValueError):
+        batch.normalize_items(["Eigenvalues", prompt])
+
+
+def test_rate_limiter_spaces_calls_across_threads():
+    limiter = batch.RateLimiter(per_minute=600)  # one call per 0.1s
+    started = []
+    lock = threading.Lock()
+
+    def call():
+        limiter.wait()
+        with lock:
+            started.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    started.sort()
+    gaps = [later - earlier for earlier, later in zip(started, started[1:])]
+    assert all(gap >= 0.09 for gap in gaps)
+    assert started[-1] - started[0] >= 0.27
+
+
+def test_resume_skips_items_still_in_the_store(pipeline, tmp_path):
+    manifest_path = str(tmp_path / "batch.json")
+    pipeline.failing.add("About Eigenvalues")
+
+    manifest = batch.run_batch(["Fourier series", "Eigenvalues"], manifest_path, batch_id="b1")
+    assert manifest["completed"] == 1
+    assert sorted(pipeline.rendered) == ["About Eigenvalues", "About Fourier series"]
+
+    # Only the failed item is generated again
+    pipeline.failing.clear()
+    pipeline.rendered.clear()
+    manifest = batch.run_batch(["Fourier series", "Eigenvalues"], manifest_path)
+    assert pipeline.rendered == ["About Eigenvalues"]
+    assert manifest["completed"] == 2
+    assert manifest["batchId"] == "b1"
+
+    # A finished item whose video has since been evicted is generated again too
+    fourier = next(e for e in manifest["items"].values() if e["prompt"] == "Fourier series")
+    media_store.discard_intermediate(media_store.lookup(fourier["jobId"]))
+    pipeline.rendered.clear()
+    batch.run_batch(["Fourier series", "Eigenvalues"], manifest_path)
+    assert pipeline.rendered == ["About Fourier series"]
+
+
+def test_job_ids_are_scoped_to_the_batch(pipeline, tmp_path):
+    key = batch.normalize_items(["Fourier series"])[0]["key"]
+    assert batch.job_id_for("b1", key) == batch.job_id_for("b1", key)
+    assert batch.job_id_for("b1", key) != batch.job_id_for("b2", key)
+
+    first = batch.run_batch(["Fourier series"], str(tmp_path / "b1.json"), batch_id="b1")
+    second = batch.run_batch(["Fourier series"], str(tmp_path / "b2.json"), batch_id="b2")
+
+    first_job = first["items"][key]["jobId"]
+    second_job = second["items"][key]["jobId"]
+    assert first_job != second_job
+    assert first["items"][key]["videoUrl"] == f"/video/{first_job}"
+    assert media_store.lookup(first_job) is not None
+    assert media_store.lookup(second_job) is not None
+
+
+def test_cancelled_item_is_recorded_and_cleaned_up(pipeline, tmp_path, monkeypatch):
+    scene_file = tmp_path / "scene.py"
+
+    def render_scene(explanation, manim_code, job_id, ticket=None, job=None):
+        scene_file.write_text(manim_code)
+        job.track_artifact(str(scene_file))
+        jobs.cancel_job(job_id)
+        job.check()
+
+    monkeypatch.setattr(batch, "render_scene", render_scene)
+    manifest = batch.run_batch(["Fourier series"], str(tmp_path / "batch.json"), batch_id="b1")
+
+    entry = next(iter(manifest["items"].values()))
+    assert entry["status"] == "cancelled"
+    assert manifest["completed"] == 0
+    assert not scene_file.exists()
+    assert entry["jobId"] not in jobs._jobs
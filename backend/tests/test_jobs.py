@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+import media_store
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    jobs._jobs.clear()
+    jobs._sessions.clear()
+    yield
+    jobs._jobs.clear()
+    jobs._sessions.clear()
+
+
+def _alive(pid):
+    # A killed child reparented to a non-reaping init lingers as a zombie
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _dies(pid, timeout=5.0):
+    # Signal delivery is asynchronous, so give the killed child a moment
+    deadline = time.monotonic() + timeout
+    while _alive(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _run_sleep_tree(job, tmp_path):
+    pid_file = tmp_path / "child.pid"
+    command = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; sleep 30"]
+    started = time.monotonic()
+    with pytest.raises(jobs.JobCancelled) as exc:
+        jobs.run_subprocess(command, job=job, check=True)
+    return exc.value, int(pid_file.read_text()), time.monotonic() - started
+
+
+def test_run_subprocess_kills_tree_on_cancel(tmp_path):
+    job = jobs.Job("cancel-me")
+    threading.Timer(0.5, job.cancel).start()
+
+    error, child_pid, elapsed = _run_sleep_tree(job, tmp_path)
+
+    assert not isinstance(error, jobs.DeadlineExceeded)
+    assert elapsed < 10
+    assert _dies(child_pid)
+
+
+def test_run_subprocess_kills_tree_on_deadline(tmp_path):
+    job = jobs.Job("slow", deadline_seconds=0.5)
+
+    error, child_pid, elapsed = _run_sleep_tree(job, tmp_path)
+
+    assert isinstance(error, jobs.DeadlineExceeded)
+    assert elapsed < 10
+    assert _dies(child_pid)
+
+
+def test_run_subprocess_without_job_is_plain_run():
+    result = jobs.run_subprocess(["echo", "hi"], capture_output=True, text=True)
+    assert result.stdout == "hi\n"
+
+
+def test_run_cancellable_stops_waiting_at_deadline():
+    job = jobs.Job("net", deadline_seconds=0.3)
+    with pytest.raises(jobs.DeadlineExceeded):
+        jobs.run_cancellable(time.sleep, 5, job=job)
+
+
+def test_newer_job_in_session_supersedes_older():
+    old = jobs.start_job("old", session_id="s1")
+    other = jobs.start_job("other", session_id="s2")
+    new = jobs.start_job("new", session_id="s1")
+
+    assert old.cancelled and old.reason == "superseded by a newer request"
+    assert not other.cancelled and not new.cancelled
+
+
+def test_jobs_without_session_never_supersede():
+    first = jobs.start_job("first")
+    jobs.start_job("second")
+    assert not first.cancelled
+
+
+def test_cancel_by_session_hits_newest_job():
+    jobs.start_job("a", session_id="s1")
+    newest = jobs.start_job("b", session_id="s1")
+    assert jobs.cancel_job(session_id="s1")
+    assert newest.cancelled
+
+
+def test_running_job_id_cannot_be_reused():
+    first = jobs.start_job("dup")
+    with pytest.raises(jobs.JobIdInUse):
+        jobs.start_job("dup")
+
+    # The original job is still the one that gets cancelled
+    assert jobs.cancel_job("dup")
+    assert first.cancelled
+
+    jobs.finish_job(first)
+    second = jobs.start_job("dup")
+    assert jobs.cancel_job("dup")
+    assert second.cancelled
+
+
+def test_indexed_job_ids_are_reported(tmp_path, monkeypatch):
+    store = tmp_path / "store"
+    monkeypatch.setattr(media_store, "STORE_DIR", str(store))
+    monkeypatch.setattr(media_store, "INDEX_PATH", str(store / "index.sqlite3"))
+    monkeypatch.setattr(media_store, "CACHE_DIRS", [])
+
+    video = tmp_path / "out.mp4"
+    video.write_bytes(b"video")
+    media_store.ingest("done1", str(video))
+
+    assert media_store.is_indexed("done1")
+    assert not media_store.is_indexed("other")
+
+
+def test_cleanup_removes_tracked_artifacts(tmp_path):
+    job = jobs.Job("partial")
+    partial = tmp_path / "partial.mp4"
+    partial.write_bytes(b"x")
+    render_dir = tmp_path / "videos" / "generated_manim_code_partial"
+    render_dir.mkdir(parents=True)
+    job.track_artifact(str(partial))
+    job.track_artifact(str(render_dir))
+
+    job.cleanup()
+
+    assert not os.path.exists(partial) and not os.path.exists(render_dir)
+
+
+def test_run_subprocess_kills_children_that_ignore_sigterm(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    command = ["sh", "-c", f"sh -c 'trap \"\" TERM; sleep 30' & echo $! > {pid_file}; sleep 30"]
+    job = jobs.Job("stubborn")
+    threading.Timer(0.5, job.cancel).start()
+
+    with pytest.raises(jobs.JobCancelled):
+        jobs.run_subprocess(command, job=job)
+
+    assert _dies(int(pid_file.read_text()))
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+import media_store
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    store_dir = tmp_path / "store"
+    monkeypatch.setattr(media_store, "STORE_DIR", str(store_dir))
+    monkeypatch.setattr(media_store, "INDEX_PATH", str(store_dir / "index.sqlite3"))
+    monkeypatch.setattr(media_store, "CACHE_DIRS", [])
+    monkeypatch.setattr(media_store, "QUOTA_BYTES", 10 ** 9)
+    monkeypatch.setattr(media_store, "TTL_SECONDS", 3600)
+    return store_dir
+
+
+def _render(tmp_path, name, content):
+    path = tmp_path / f"{name}.mp4"
+    path.write_bytes(content)
+    return str(path)
+
+
+def _set_last_access(job_id, when):
+    conn = media_store._connect()
+    try:
+        conn.execute(
+            "UPDATE blobs SET last_access = ? WHERE sha256 = "
+            "(SELECT sha256 FROM artifacts WHERE job_id = ?)",
+            (when, job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_identical_outputs_are_stored_once(tmp_path):
+    first = media_store.ingest("a", _render(tmp_path, "a", b"same video"))
+    second_source = _render(tmp_path, "b", b"same video")
+    second = media_store.ingest("b", second_source)
+
+    assert first == second
+    assert not os.path.exists(second_source)
+    assert media_store.lookup("a") == media_store.lookup("b") == first
+    assert media_store.lookup("missing") is None
+
+
+def test_outputs_past_ttl_are_evicted(tmp_path):
+    stale = media_store.ingest("stale", _render(tmp_path, "stale", b"old"))
+    media_store.ingest("fresh", _render(tmp_path, "fresh", b"new"))
+    _set_last_access("stale", time.time() - 7200)
+
+    media_store.enforce_retention()
+
+    assert media_store.lookup("stale") is None
+    assert not os.path.exists(stale)
+    assert not media_store.is_indexed("stale")
+    assert media_store.lookup("fresh") is not None
+
+
+def test_least_recently_used_outputs_are_evicted_to_fit_quota(tmp_path, monkeypatch):
+    for i, job_id in enumerate(["oldest", "middle", "newest"]):
+        media_store.ingest(job_id, _render(tmp_path, job_id, bytes([i]) * 100))
+        _set_last_access(job_id, time.time() - 100 + i)
+    monkeypatch.setattr(media_store, "QUOTA_BYTES", 250)
+
+    media_store.enforce_retention()
+
+    assert media_store.lookup("oldest") is None
+    assert media_store.lookup("middle") is not None
+    assert media_store.lookup("newest") is not None
+
+
+def test_just_stored_output_is_kept_even_over_quota(tmp_path, monkeypatch):
+    media_store.ingest("older", _render(tmp_path, "older", b"x" * 100))
+    monkeypatch.setattr(media_store, "QUOTA_BYTES", 150)
+
+    # Fresh enough to be most recently used, yet alone over quota
+    path = media_store.ingest("big", _render(tmp_path, "big", b"y" * 200))
+
+    assert os.path.exists(path)
+    assert media_store.lookup("big") == path
+    assert media_store.lookup("older") is None
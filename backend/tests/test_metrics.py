@@ -0,0 +1,57 @@
+import pytest
+
+import metrics
+from jobs import JobCancelled, DeadlineExceeded
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics._counters.clear()
+    metrics._histograms.clear()
+    yield
+    metrics._counters.clear()
+    metrics._histograms.clear()
+
+
+def _run_request(stage_body):
+    with metrics.track_request("topic") as tracked:
+        with metrics.stage("render") as span:
+            stage_body(span)
+    return tracked
+
+
+def test_stage_and_request_share_status_labels():
+    _run_request(lambda span: None)
+
+    def report_failure(span):
+        span["failed"] = True
+    tracked = _run_request(report_failure)
+
+    def raise_error(span):
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        _run_request(raise_error)
+
+    def cancel(span):
+        raise JobCancelled("cancelled by client")
+    with pytest.raises(JobCancelled):
+        _run_request(cancel)
+
+    def time_out(span):
+        raise DeadlineExceeded()
+    with pytest.raises(DeadlineExceeded):
+        _run_request(time_out)
+
+    assert tracked["stages"][0]["status"] == "failed"
+    output = metrics.render_metrics()
+    assert 'voicemation_stage_total{stage="render",status="ok"} 1' in output
+    assert 'voicemation_stage_total{stage="render",status="failed"} 1' in output
+    assert 'voicemation_stage_total{stage="render",status="error"} 1' in output
+    assert 'voicemation_stage_total{stage="render",status="cancelled"} 2' in output
+    # A request whose stage failed by return value is only failed if it says so
+    assert 'voicemation_requests_total{status="ok"} 2' in output
+    assert 'voicemation_requests_total{status="error"} 1' in output
+    assert 'voicemation_requests_total{status="cancelled"} 2' in output
+    assert 'voicemation_stage_duration_seconds_count{stage="render"} 5' in output
+    assert "# TYPE voicemation_stage_total counter" in output
+    assert "# TYPE voicemation_request_duration_seconds histogram" in output
@@ -6,8 +6,13 @@ from azure.ai.inference import ChatCompletionsClient
 from azure.ai.inference.models import SystemMessage, UserMessage
 from azure.core.credentials import AzureKeyCredential
 from voiceover_utils import generate_voiceover
+from metrics import track_request, stage
+import media_store
+from admission import controller as admission_controller
+from jobs import JobCancelled, run_subprocess, run_cancellable
 from dotenv import load_dotenv
 import shutil
+import uuid
 # extra imports for syncing
 from mutagen.mp3 import MP3
 
@@ -229,13 +234,44 @@ class {class_name}(Scene):
 
 
 # Function to process speech and trigger animations
-def process_speech(speech_text, in_depth_mode=False):
+def process_speech(speech_text, in_depth_mode=False, job_id=None, ticket=None, job=None):
+    """
+    Run the whole pipeline for one prompt. `job` (from jobs.start_job) carries the
+    deadline and cancel flag; if it is cancelled, partial files are removed and
+    JobCancelled is raised.
+    """
     if "exit" in speech_text.lower():
         print("Exiting program...")
         return None  # Stop listening, no video generated
 
+    job_id = job_id or uuid.uuid4().hex[:12]
+    with track_request(speech_text, request_id=job_id) as tracked:
+        try:
+            video_path = _run_pipeline(speech_text, in_depth_mode, job_id, ticket, job)
+        except JobCancelled:
+            tracked["cancelled"] = True
+            job.cleanup()
+            raise
+        if not video_path:
+            tracked["failed"] = True
+        return video_path
+
+
+def _run_pipeline(speech_text, in_depth_mode, job_id, ticket, job):
+    explanation, manim_code = prepare_scene(speech_text, in_depth_mode, job)
+    if not manim_code:
+        return None
+    return render_scene(explanation, manim_code, job_id, ticket, job)  # ✅ Return video path back to Flask
+
+
+def prepare_scene(speech_text, in_depth_mode=False, job=None):
+    """
+    LLM half of the pipeline: returns (explanation, manim_code), with manim_code
+    sanitized (and extended for in-depth mode), or None if GPT gave no code.
+    """
     print(f"🧠 Sending speech to GPT for animation generation... (In Depth Mode: {in_depth_mode})")
-    gpt_response = get_gpt_response(speech_text, in_depth_mode)
+    with stage("get_gpt_response"):
+        gpt_response = get_gpt_response(speech_text, in_depth_mode, job)
     
     # Debug: Log the GPT response to see what we're getting
     print(f"\n📝 GPT Response Length: {len(gpt_response)} characters")
@@ -244,11 +280,13 @@ def process_speech(speech_text, in_depth_mode=False):
         print(f"🎬 IN-DEPTH MODE: Response should be much longer with multiple scenes")
 
     # 🔹 Extract explanation + Manim code separately
-    explanation, manim_code = extract_explanation_and_code(gpt_response)
+    with stage("extract_explanation_and_code"):
+        explanation, manim_code = extract_explanation_and_code(gpt_response)
 
     if manim_code:
         # Sanitize Manim code for v0.18
-        manim_code = sanitize_manim_code(manim_code)
+        with stage("sanitize_manim_code"):
+            manim_code = sanitize_manim_code(manim_code)
         
         # Debug: Check code length and content
         print(f"📊 Generated Manim code length: {len(manim_code)} characters")
@@ -266,16 +304,36 @@ def process_speech(speech_text, in_depth_mode=False):
         if in_depth_mode and wait_count < 5:
             print(f"⚠️ WARNING: In-depth mode should have many more wait() statements for 2+ minute videos")
 
+        return explanation, manim_code
+    else:
+        print("❌ No valid Manim code generated.")
+        return explanation, None
+
+
+def render_scene(explanation, manim_code, job_id, ticket=None, job=None):
+    """
+    Render half of the pipeline: runs Manim on the code and narrates it.
+    Waits for a render slot from the admission controller; `ticket` is the
+    caller's admission ticket, or None to queue as a local job.
+    Returns the final video path, or None on failure.
+    """
+    own_ticket = ticket is None
+    if own_ticket:
+        ticket = admission_controller.admit("local", enforce_limit=False)
+
+    try:
+        admission_controller.refine(ticket, manim_code)
         class_name = extract_class_name(manim_code)
-        temp_file_path = save_manim_code_to_temp_file(manim_code)
+        temp_file_path = save_manim_code_to_temp_file(manim_code, job_id)
+        if job:
+            job.track_artifact(temp_file_path)
 
         # ✅ Pass the natural language explanation as narration
-        final_video_path = run_manim(temp_file_path, class_name, explanation)
-
-        return final_video_path  # ✅ Return video path back to Flask
-    else:
-        print("❌ No valid Manim code generated.")
-        return None
+        with admission_controller.render_slot(ticket, job):
+            return run_manim(temp_file_path, class_name, explanation, job_id, job)
+    finally:
+        if own_ticket:
+            admission_controller.release(ticket)
 
 
 
@@ -292,7 +350,7 @@ def extract_explanation_and_code(gpt_response):
 
 
 # Get GPT response using Azure AI Inference
-def get_gpt_response(speech_text, in_depth_mode=False):
+def get_gpt_response(speech_text, in_depth_mode=False, job=None):
     print(f"🔄 Starting GPT request for: {speech_text[:50]}... (in_depth_mode={in_depth_mode})")
     
     endpoint = "https://models.github.ai/inference"
@@ -395,7 +453,10 @@ def get_gpt_response(speech_text, in_depth_mode=False):
     try:
         print("🚀 Making API call to GitHub Models...")
         
-        response = client.complete(
+        # Cancellable: if the job is cancelled or times out we stop waiting on the call
+        response = run_cancellable(
+            client.complete,
+            job=job,
             messages=[
                 SystemMessage(system_message_content),
                 UserMessage(f"{speech_text}" + (" - CREATE A COMPREHENSIVE 2+ MINUTE IN-DEPTH EDUCATIONAL ANIMATION WITH EXTENSIVE STEP-BY-STEP EXPLANATIONS, MULTIPLE EXAMPLES, MATHEMATICAL PROOFS, REAL-WORLD APPLICATIONS, AND DETAILED VISUAL DEMONSTRATIONS. MINIMUM 100+ LINES OF MANIM CODE WITH 15+ WAIT STATEMENTS TOTALING 120+ SECONDS." if in_depth_mode else "")),
@@ -408,6 +469,8 @@ def get_gpt_response(speech_text, in_depth_mode=False):
         
         print("✅ API call successful!")
         
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"❌ API call failed: {e}")
         print(f"❌ Error type: {type(e).__name__}")
@@ -440,11 +503,12 @@ def extract_class_name(manim_code):
     return "Scene"
 
 
-# Save code to a temp .py file
-def save_manim_code_to_temp_file(manim_code):
+# Save code to a temp .py file (one per job so concurrent renders don't clobber each other)
+def save_manim_code_to_temp_file(manim_code, job_id=None):
+    module_name = f"generated_manim_code_{job_id}" if job_id else "generated_manim_code"
     temp_file_path = os.path.join(
         os.getenv("TEMP", "/tmp"),
-        "generated_manim_code.py"
+        f"{module_name}.py"
     )
     with open(temp_file_path, "w", encoding="utf-8") as file:
         file.write(manim_code)
@@ -461,9 +525,11 @@ def get_audio_duration(audio_path):
 # Run the Manim animation
 from voiceover_utils import generate_voiceover, add_voiceover_to_video
 
-def run_manim(temp_file_path, class_name, explanation):
+def run_manim(temp_file_path, class_name, explanation, job_id=None, job=None):
     """
     Run manim to generate video and then merge it with AI narration.
+    The merged video is moved into the media store under job_id.
+    If `job` is cancelled, the Manim/ffmpeg process trees are killed and JobCancelled is raised.
     Returns the path to the final video with voiceover.
     """
     
@@ -476,25 +542,35 @@ def run_manim(temp_file_path, class_name, explanation):
 
     command = [manim_path, "-ql", temp_file_path, class_name]  # -ql for quick low-quality render
 
+    # Manim names its output directory after the scene file
+    module_name = os.path.splitext(os.path.basename(temp_file_path))[0]
     video_output_path = os.path.join(
-    "media", "videos", "generated_manim_code", "480p15", f"{class_name}.mp4"
+    "media", "videos", module_name, "480p15", f"{class_name}.mp4"
 )
+    if job:
+        job.track_artifact(os.path.dirname(os.path.dirname(video_output_path)))
 
-
+    narration_path = None
     try:
         print("🎬 Running Manim command:", " ".join(command))
         # Increase timeout for longer in-depth animations
         timeout_duration = 300  # 5 minutes for complex animations
-        subprocess.run(command, capture_output=True, text=True, check=True, timeout=timeout_duration)
+        with stage("manim_render"):
+            run_subprocess(command, job=job, capture_output=True, text=True, check=True, timeout=timeout_duration)
         print("\n✅ Manim animation complete.\n")
 
         # Generate voiceover
-        narration_path = generate_voiceover(explanation)
+        with stage("generate_voiceover"):
+            narration_path = generate_voiceover(explanation, job)
 
         # Merge video with voiceover (using ffmpeg)
-        final_output = add_voiceover_to_video(video_output_path, narration_path)
+        with stage("add_voiceover_to_video") as span:
+            final_output = add_voiceover_to_video(video_output_path, narration_path, job)
+            # add_voiceover_to_video reports ffmpeg failures by returning None
+            span["failed"] = final_output is None
 
         if final_output:
+            final_output = media_store.ingest(job_id or uuid.uuid4().hex[:12], final_output)
             print(f"🎉 Final video ready at: {final_output}")
             return final_output   # ✅ return path here
         else:
@@ -509,11 +585,31 @@ def run_manim(temp_file_path, class_name, explanation):
     except subprocess.TimeoutExpired:
         print("⏱ Manim command timed out.")
         return None
+    finally:
+        # The silent render, its partial movie files, the narration and the scene file
+        # are per-job inputs to the mux; remove them whether or not the job succeeded
+        media_store.discard_intermediate(os.path.dirname(os.path.dirname(video_output_path)))
+        media_store.discard_intermediate(narration_path)
+        media_store.discard_intermediate(temp_file_path)
 
 
 
-# Main speech recognition loop
+# Main speech recognition loop (or batch mode: python voicemation.py --batch prompts.jsonl)
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Voice-driven Manim animation generator")
+    parser.add_argument("--batch", metavar="PROMPTS", help="JSONL/JSON/text file of prompts to generate in bulk")
+    parser.add_argument("--manifest", default="batch_manifest.json", help="Manifest path for batch results (re-use it to resume)")
+    parser.add_argument("--in-depth", action="store_true", help="Default prompts to in-depth mode in batch runs")
+    args = parser.parse_args()
+
+    if args.batch:
+        from batch import load_prompts, run_batch
+
+        run_batch(load_prompts(args.batch), args.manifest, args.in_depth)
+        raise SystemExit(0)
+
     recognizer = sr.Recognizer()
 
     while True:
@@ -4,26 +4,33 @@ import os
 import subprocess
 from gtts import gTTS
 import tempfile
+from jobs import run_subprocess, run_cancellable
 
 
-def generate_voiceover(text):
+def generate_voiceover(text, job=None):
     """
     Convert input text to speech using gTTS and save as MP3.
+    Stops waiting (raising JobCancelled) if `job` is cancelled.
     Returns path to the saved file.
     """
     tts = gTTS(text)
-    temp_audio_path = os.path.join(tempfile.gettempdir(), "voiceover.mp3")
-    tts.save(temp_audio_path)
+    # Unique file per call so concurrent jobs don't overwrite each other's narration
+    fd, temp_audio_path = tempfile.mkstemp(prefix="voiceover_", suffix=".mp3")
+    os.close(fd)
+    if job:
+        job.track_artifact(temp_audio_path)
+    run_cancellable(tts.save, temp_audio_path, job=job)
     print(f"🔊 Voiceover saved to: {temp_audio_path}")
     return temp_audio_path
 
 
-def add_voiceover_to_video(video_path, audio_path):
+def add_voiceover_to_video(video_path, audio_path, job=None):
     """
     Ug se ffmpeto merge video and audio into a new output file.
     Ensures video matches the length of the narration:
       - If audio is longer → video loops until narration ends
       - If video is longer → video trims to narration length
+    If `job` is cancelled, ffmpeg is killed and JobCancelled is raised.
     Returns path to the final merged video.
     """
     if not os.path.exists(video_path):
@@ -48,7 +55,7 @@ def add_voiceover_to_video(video_path, audio_path):
 
     try:
         print("🎞️ Merging video and voiceover using ffmpeg...")
-        subprocess.run(command, check=True)
+        run_subprocess(command, job=job, check=True)
         print(f"✅ Final video with voiceover saved at: {output_path}")
         return output_path
     except subprocess.CalledProcessError as e:
@@ -2,6 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import VoiceInputSimple from '../components/VoiceInputSimple';
 import AnimationPlayer from '../components/AnimationPlayer';
+import { sessionHeaders } from '../session';
 
 export default function Dashboard({ activeConversation }) {
   const [messages, setMessages] = useState([]);
@@ -64,6 +65,7 @@ export default function Dashboard({ activeConversation }) {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...sessionHeaders(),
         },
         body: JSON.stringify({ text: text }),
       });
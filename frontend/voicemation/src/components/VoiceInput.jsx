@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import SimpleAnimationPlayer from './SimpleAnimationPlayer';
 import ErrorBoundary from './ErrorBoundary';
+import { sessionHeaders } from '../session';
 
 // Reusable Button Component for consistent styling
 const ActionButton = ({ onClick, icon, text, variant = 'primary', className = '', initial = {}, animate = {}, delay = 0, testId = '' }) => {
@@ -175,6 +176,7 @@ export default function VoiceInput({ onResult, currentAnimation, isGenerating, o
 
           const response = await fetch('/generate_audio', {
             method: 'POST',
+            headers: sessionHeaders(),
             body: formData
           });
 
@@ -1,5 +1,6 @@
 import React, { useState, useCallback, useRef, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
+import { sessionHeaders } from '../session';
 
 const VoiceInputSimple = ({ onResult }) => {
   const [isRecording, setIsRecording] = useState(false);
@@ -91,6 +92,7 @@ const VoiceInputSimple = ({ onResult }) => {
 
       const response = await fetch('http://localhost:5001/generate_audio', {
         method: 'POST',
+        headers: sessionHeaders(),
         body: formData,
       });
 
@@ -137,6 +139,7 @@ const VoiceInputSimple = ({ onResult }) => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...sessionHeaders(),
         },
         body: JSON.stringify({ 
           text: text.trim(),
@@ -0,0 +1,19 @@
+// Per-tab session ID sent with generation requests. The backend cancels a
+// session's running job when a newer request arrives from the same tab.
+const SESSION_KEY = 'voicemationSessionId';
+
+const newId = () =>
+  (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID().replace(/-/g, '')
+    : Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+export function getSessionId() {
+  let id = sessionStorage.getItem(SESSION_KEY);
+  if (!id) {
+    id = newId();
+    sessionStorage.setItem(SESSION_KEY, id);
+  }
+  return id;
+}
+
+export const sessionHeaders = () => ({ 'X-Session-Id': getSessionId() });